@@ -0,0 +1,225 @@
+# File: backend/ai_scripts/_kernels.py
+# Purpose: Numeric helpers and Numba-compiled kernels shared by the AI scripts
+# Date: 2025-12-08
+#
+# Every numba kernel here has a NumPy equivalent in the calling script, which
+# is used when numba is not installed (check NUMBA_AVAILABLE before calling).
+
+import sys
+import warnings
+import numpy as np
+
+# Try to import Numba
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+    print("Warning: Numba not available. Install with: pip install numba", file=sys.stderr)
+
+    def njit(*args, **kwargs):
+        """No-op stand-in so this module still imports without numba"""
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda func: func
+
+def parse_timestamps(values):
+    """
+    Parse timestamps numpy can't with pandas: the fixed ISO-8601 parser first,
+    then format inference (pandas is imported here, on first use)
+    
+    Returns:
+        datetime64[ns] array in UTC without timezone (like numpy's own parsing)
+    """
+    import pandas as pd
+    try:
+        parsed = pd.to_datetime(values, format='ISO8601', utc=True, cache=True)
+    except (ValueError, TypeError):
+        parsed = pd.to_datetime(values, utc=True, cache=True)
+    return parsed.tz_convert(None).to_numpy()
+
+def sorted_history(history_data):
+    """
+    Timestamps and prices from a list of {price, timestamp} dicts, in time order
+    
+    Timestamps numpy can't parse go through parse_timestamps (which raises if
+    pandas can't parse them either); they are never sorted as raw strings.
+    
+    Args:
+        history_data: List of {price, timestamp} dicts
+    
+    Returns:
+        tuple: (timestamps, float64 prices), or None if a record is missing
+        its price or timestamp
+    """
+    if not history_data or not all('price' in d and 'timestamp' in d for d in history_data):
+        return None
+    
+    prices = np.array([d['price'] for d in history_data], dtype=np.float64)
+    timestamps = [d['timestamp'] for d in history_data]
+    try:
+        # ISO strings (with Z/offsets) or epoch numbers; numpy warns that it drops the timezone
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            ts = np.array(timestamps, dtype='datetime64[ns]')
+    except (ValueError, TypeError):
+        ts = parse_timestamps(timestamps)
+    
+    order = np.argsort(ts, kind='stable')
+    return ts[order], prices[order]
+
+def sorted_prices(history_data):
+    """
+    Prices from a list of {price, timestamp} dicts as a float64 array in time order
+    
+    Returns:
+        numpy array, or None if a record is missing its price or timestamp
+    """
+    history = sorted_history(history_data)
+    return history[1] if history is not None else None
+
+@njit(cache=True)
+def rolling_mean_tail(prices, window, count):
+    """
+    Last `count` values of the `window`-point rolling mean, from one running-sum
+    pass over the tail (needs len(prices) >= window + count - 1)
+
+    Like pandas' rolling(window).mean(), a mean is NaN while a NaN price is
+    inside its window; NaNs are counted, not added, so they don't stay in
+    the running sum after leaving the window.
+
+    Returns:
+        float64 array of length count; [-1] is the latest mean and
+        [0] the mean as of count - 1 points earlier
+    """
+    start = prices.size - (window + count - 1)
+    total = 0.0
+    missing = 0
+    for i in range(start, start + window):
+        if np.isnan(prices[i]):
+            missing += 1
+        else:
+            total += prices[i]
+
+    out = np.empty(count)
+    out[0] = total / window if missing == 0 else np.nan
+    for j in range(1, count):
+        # Slide the window: add the entering price, subtract the leaving one
+        entering = start + window - 1 + j
+        entering_price = prices[entering]
+        leaving_price = prices[entering - window]
+        if np.isnan(entering_price):
+            missing += 1
+            entering_price = 0.0
+        if np.isnan(leaving_price):
+            missing -= 1
+            leaving_price = 0.0
+        total += entering_price - leaving_price
+        out[j] = total / window if missing == 0 else np.nan
+    return out
+
+@njit(cache=True)
+def arima_111_forecast(prices, steps):
+    """
+    Forecast prices with an ARIMA(1,1,1) model (no constant) whose parameters
+    are estimated by moment matching instead of maximum likelihood
+    (random walk when the changes show no significant autocorrelation)
+
+    The price changes x_t follow x_t = phi * x_{t-1} + e_t + theta * e_{t-1}.
+    phi = rho2 / rho1 and theta is the invertible root of the ARMA(1,1) lag-1
+    autocorrelation equation. Residuals are filtered from e_0 = 0.
+
+    Returns:
+        float64 array of the next `steps` prices
+    """
+    x = np.diff(prices)
+    n = x.size
+
+    # Uncentered autocovariances, matching the zero-mean model
+    c0 = 0.0
+    c1 = 0.0
+    c2 = 0.0
+    for t in range(n):
+        c0 += x[t] * x[t]
+        if t >= 1:
+            c1 += x[t] * x[t - 1]
+        if t >= 2:
+            c2 += x[t] * x[t - 2]
+
+    phi = 0.0
+    theta = 0.0
+    # Lag-1 autocorrelation within noise of zero (|r1| < 2/sqrt(n)): the ratio
+    # rho2/rho1 is meaningless, so forecast a random walk
+    if c0 > 0 and abs(c1 / c0) >= 2 / np.sqrt(n):
+        r1 = c1 / c0
+        phi = min(max(c2 / c1, -0.99), 0.99)
+        # (phi - r1) * theta^2 + (1 + phi^2 - 2 * r1 * phi) * theta + (phi - r1) = 0;
+        # the roots multiply to 1, so take the one inside the unit circle
+        a = phi - r1
+        b = 1 + phi * phi - 2 * r1 * phi
+        disc = b * b - 4 * a * a
+        if a != 0 and disc >= 0:
+            theta = (-b + np.sqrt(disc)) / (2 * a)
+            if abs(theta) > 1:
+                theta = 1 / theta
+            theta = min(max(theta, -0.99), 0.99)
+
+    e = 0.0
+    for t in range(1, n):
+        e = x[t] - phi * x[t - 1] - theta * e
+
+    out = np.empty(steps)
+    level = prices[-1]
+    change = phi * x[-1] + theta * e if n > 0 else 0.0
+    for h in range(steps):
+        level += change
+        out[h] = level
+        change *= phi
+    return out
+
+@njit(cache=True, fastmath=True)
+def metrics_kernel(a, p):
+    """
+    Evaluation metrics for two equal-length float64 arrays in one pass
+
+    Returns:
+        tuple: (mae, rmse, mape, mape_points, direction_accuracy,
+                a_mean, p_mean, a_std, p_std)
+        mape is only meaningful when mape_points > 0 and
+        direction_accuracy only when len(a) > 1
+    """
+    n = a.size
+    sum_abs = 0.0
+    sum_sq = 0.0
+    sum_pct = 0.0
+    n_pct = 0
+    sum_a = 0.0
+    sum_p = 0.0
+    dir_matches = 0
+    for i in range(n):
+        d = a[i] - p[i]
+        sum_abs += abs(d)
+        sum_sq += d * d
+        if a[i] != 0:
+            sum_pct += abs(d) / abs(a[i])
+            n_pct += 1
+        sum_a += a[i]
+        sum_p += p[i]
+        if i > 0 and (a[i] > a[i - 1]) == (p[i] > p[i - 1]):
+            dir_matches += 1
+
+    a_mean = sum_a / n
+    p_mean = sum_p / n
+
+    # Second pass for the variance keeps it as accurate as np.std
+    var_a = 0.0
+    var_p = 0.0
+    for i in range(n):
+        var_a += (a[i] - a_mean) ** 2
+        var_p += (p[i] - p_mean) ** 2
+
+    mape = sum_pct / n_pct * 100 if n_pct > 0 else 0.0
+    direction_accuracy = dir_matches / (n - 1) * 100 if n > 1 else 0.0
+
+    return (sum_abs / n, np.sqrt(sum_sq / n), mape, n_pct, direction_accuracy,
+            a_mean, p_mean, np.sqrt(var_a / n), np.sqrt(var_p / n))
@@ -0,0 +1,104 @@
+# File: backend/ai_scripts/_stdio.py
+# Purpose: Newline-delimited JSON request loop for the long-running script workers
+# Date: 2025-12-08
+#
+# Protocol (one JSON object per line, see services/pythonWorkerService.js):
+#   Request:  {"id": 1, ...}
+#   Response: {"id": 1, "result": ...} or {"id": 1, "error": "..."}
+#
+# loads()/dumps() use orjson when it is installed (several times faster on
+# multi-KB price histories) and the json module otherwise.
+
+import sys
+import json
+import math
+import threading
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+_stdout_lock = threading.Lock()
+
+# Returned by a handler that answers the request later itself
+# (e.g. from a batching thread) via respond()
+DEFERRED = object()
+
+def loads(data):
+    """Parse JSON from a str or bytes (raises json.JSONDecodeError on bad input)"""
+    if ORJSON_AVAILABLE:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            # orjson rejects lone surrogate escapes ("\ud83d"), which JSON.stringify
+            # emits for text cut in the middle of an emoji; json accepts them
+            pass
+    return json.loads(data)
+
+def _finite(obj):
+    """Copy of obj with NaN/Infinity floats replaced by None"""
+    if isinstance(obj, float):
+        return obj if math.isfinite(obj) else None
+    if isinstance(obj, dict):
+        return {key: _finite(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_finite(value) for value in obj]
+    return obj
+
+def _dumps_bytes(obj):
+    # NaN/Infinity become null on both paths: JSON.parse on the Node side
+    # rejects the bare NaN the json module writes by default
+    if ORJSON_AVAILABLE:
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+        except orjson.JSONEncodeError:
+            # e.g. a lone surrogate echoed back from a request; json escapes it
+            pass
+    return json.dumps(_finite(obj), allow_nan=False).encode()
+
+def dumps(obj):
+    """Serialize to a JSON str (numpy scalars and arrays allowed with orjson)"""
+    return _dumps_bytes(obj).decode()
+
+def respond(response):
+    """Write one response line (safe to call from several threads)"""
+    line = _dumps_bytes(response) + b"\n"
+    with _stdout_lock:
+        # UTF-8 bytes straight to the pipe, whatever the console encoding is
+        sys.stdout.flush()
+        sys.stdout.buffer.write(line)
+        sys.stdout.buffer.flush()
+
+def serve_stdio(handle):
+    """
+    Answer requests from stdin until EOF
+
+    Args:
+        handle: Function taking the request dict and returning its result
+                (or DEFERRED); exceptions are sent back as error responses
+    """
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+
+        try:
+            request = loads(line)
+        except json.JSONDecodeError as e:
+            respond({"id": None, "error": f"Invalid JSON: {str(e)}"})
+            continue
+
+        if not isinstance(request, dict):
+            respond({"id": None, "error": "Request must be a JSON object"})
+            continue
+
+        request_id = request.get("id")
+        try:
+            result = handle(request)
+        except Exception as e:
+            respond({"id": request_id, "error": str(e)})
+            continue
+
+        if result is not DEFERRED:
+            respond({"id": request_id, "result": result})
@@ -0,0 +1,84 @@
+# File: backend/ai_scripts/ai_worker.py
+# Purpose: One long-lived worker process serving every AI script task
+# Date: 2025-12-08
+#
+# Each script module is imported on first use, so one interpreter (with one
+# copy of numpy/pandas/torch, the MiniLM model and the loaded RF models)
+# serves all requests instead of a process per script.
+#
+# Usage:
+#   python ai_worker.py --server
+#
+# Request:  {"id": 1, "task": "embed" | "hybrid" | "sentiment" | "price" | "predict" | "evaluate", "args": {...}}
+# Response: {"id": 1, "result": ...} or {"id": 1, "error": "..."}
+
+import sys
+import json
+import importlib
+from _stdio import DEFERRED, serve_stdio
+
+_modules = {}
+_batcher = None
+
+def _load(name):
+    """Import a script module on first use"""
+    if name not in _modules:
+        try:
+            _modules[name] = importlib.import_module(name)
+        except SystemExit:
+            # Scripts exit at import when a required library is missing
+            raise RuntimeError(f"Failed to load {name} (missing dependencies?)")
+    return _modules[name]
+
+def embed(request, args):
+    """{"text": ...} -> int8-quantized embedding, answered by the micro-batching thread"""
+    global _batcher
+    if _batcher is None:
+        # The batcher loads MiniLM on its own thread; other tasks keep flowing
+        _batcher = _load('embed_text').EmbeddingBatcher()
+    _batcher.submit(request.get('id'), args.get('text', ''))
+    return DEFERRED
+
+def hybrid(request, args):
+    """{"history": [...], "news_text": ...} -> hybrid signal"""
+    return _load('hybrid_analyzer').hybrid_analyze(args.get('history', []), args.get('news_text') or '')
+
+def sentiment(request, args):
+    """{"text": ..., "method": "auto" | "textblob" | "vader"} -> sentiment label/score"""
+    return _load('sentiment_analyzer').handle_request(args)
+
+def price(request, args):
+    """{"history": [...], "no_cache"?, "accurate_arima"?, "force_prophet"?} -> SMA/ARIMA/Prophet price analysis"""
+    return _load('price_analyzer').handle_request(args)
+
+def predict(request, args):
+    """{"symbol": ..., "history": [...]} or {"requests": [...]} -> ML prediction(s)"""
+    return _load('ml_price_predictor').handle_request(args)
+
+def evaluate(request, args):
+    """{"actual": [...], "predicted": [...]} -> evaluation metrics"""
+    return _load('evaluation').calculate_all_metrics(args.get('actual', []), args.get('predicted', []))
+
+TASKS = {
+    'embed': embed,
+    'hybrid': hybrid,
+    'sentiment': sentiment,
+    'price': price,
+    'predict': predict,
+    'evaluate': evaluate
+}
+
+def handle_request(request):
+    task = TASKS.get(request.get('task'))
+    if task is None:
+        raise ValueError(f"Unknown task: {request.get('task')}")
+    return task(request, request.get('args') or {})
+
+if __name__ == "__main__":
+    if "--server" not in sys.argv[1:]:
+        print(json.dumps({"error": "Usage: python ai_worker.py --server"}))
+        sys.exit(1)
+
+    serve_stdio(handle_request)
+    if _batcher is not None:
+        _batcher.close()
@@ -4,10 +4,23 @@
 #
 # This script generates embeddings for text using a lightweight model
 # Model: sentence-transformers/all-MiniLM-L6-v2 (384 dimensions)
+#
+# Usage:
+#   python embed_text.py <text>     one-shot, prints the embedding
+#   python embed_text.py --server   long-lived worker, newline-delimited JSON on stdin/stdout
+#
+# Server responses carry int8-quantized vectors ({"q": [...], "scale": s},
+# see quantize_embedding); the one-shot mode still prints plain floats.
 
 import sys
 import json
 import os
+import hashlib
+import queue
+import threading
+import time
+from collections import OrderedDict
+from _stdio import DEFERRED, respond, serve_stdio
 
 # Fix numpy import issues by setting environment variable
 os.environ['KMP_DUPLICATE_LIB_OK'] = 'TRUE'
@@ -27,6 +40,7 @@ except Exception as e:
     sys.exit(1)
 
 try:
+    import torch
     from sentence_transformers import SentenceTransformer
     MODEL_AVAILABLE = True
 except ImportError as e:
@@ -38,15 +52,26 @@ except Exception as e:
     print(json.dumps({"error": f"Failed to import sentence-transformers: {str(e)}. Try: pip install --upgrade --force-reinstall sentence-transformers"}), file=sys.stderr)
     sys.exit(1)
 
+# Server mode: requests arriving within this window are encoded as one batch
+BATCH_WINDOW_SECONDS = 0.03
+BATCH_SIZE = 32
+
 # Load model (cached after first load)
 _model = None
 
+# LRU cache of embeddings keyed on a hash of the normalized text
+EMB_CACHE_SIZE = 10_000
+_EMB_CACHE = OrderedDict()
+
 def get_model():
     """Lazy load model to avoid reloading on each call"""
     global _model
     if _model is None:
         try:
-            _model = SentenceTransformer('all-MiniLM-L6-v2')
+            device = 'cuda' if torch.cuda.is_available() else 'cpu'
+            _model = SentenceTransformer('all-MiniLM-L6-v2', device=device)
+            if device == 'cuda':
+                _model.half()  # fp16 halves memory traffic on GPU
         except Exception as e:
             print(json.dumps({"error": f"Failed to load model: {str(e)}"}), file=sys.stderr)
             sys.exit(1)
@@ -62,20 +87,169 @@ def generate_embedding(text):
     Returns:
         list: Embedding vector (384 dimensions)
     """
-    if not text or not text.strip():
-        return None
+    embedding = generate_embeddings([text])[0]
+    return embedding.tolist() if embedding is not None else None
+
+def quantize_embedding(embedding):
+    """
+    Symmetric int8 quantization with one scale per vector
+    
+    Embeddings are L2-normalized, so the rounding error barely moves cosine
+    similarity while the JSON payload shrinks about 4x.
+    
+    Returns:
+        dict: {"q": int8 values in [-127, 127], "scale": float}; q[i] * scale ~= embedding[i]
+    """
+    peak = float(np.max(np.abs(embedding)))
+    scale = peak / 127.0 if peak > 0 else 1.0
+    q = np.round(embedding / scale).astype(np.int8)
+    return {"q": q.tolist(), "scale": scale}
+
+def _cache_key(text):
+    # all-MiniLM-L6-v2 is uncased and ignores surrounding whitespace,
+    # so normalized variants of a text share one embedding
+    return hashlib.blake2b(text.strip().lower().encode('utf-8', 'surrogatepass'), digest_size=16).digest()
+
+def generate_embeddings(texts):
+    """
+    Generate embeddings for several texts with a single encode call
+    
+    Args:
+        texts: List of text strings to embed
+    
+    Returns:
+        list: float32 embedding arrays in input order (None for empty texts or on failure)
+    """
+    embeddings = [None] * len(texts)
+    
+    # Serve repeats from the LRU cache, encode each remaining text once
+    misses = OrderedDict()
+    for i, text in enumerate(texts):
+        if not isinstance(text, str) or not text.strip():
+            continue
+        key = _cache_key(text)
+        hit = _EMB_CACHE.get(key)
+        if hit is not None:
+            _EMB_CACHE.move_to_end(key)
+            embeddings[i] = hit
+        else:
+            misses.setdefault(key, (text, []))[1].append(i)
+    
+    if not misses:
+        return embeddings
     
     try:
         model = get_model()
-        embedding = model.encode(text, normalize_embeddings=True)
-        return embedding.tolist()
+        with torch.inference_mode():
+            encoded = model.encode(
+                [text for text, _ in misses.values()],
+                batch_size=BATCH_SIZE,
+                convert_to_numpy=True,
+                normalize_embeddings=True
+            )
+        # fp16 output on GPU: cast back so every embedding is float32
+        encoded = encoded.astype(np.float32, copy=False)
+        for (key, (_, indices)), embedding in zip(misses.items(), encoded):
+            embedding = embedding.copy()  # own row, so eviction frees it
+            _EMB_CACHE[key] = embedding
+            if len(_EMB_CACHE) > EMB_CACHE_SIZE:
+                _EMB_CACHE.popitem(last=False)
+            for i in indices:
+                embeddings[i] = embedding
     except Exception as e:
         print(json.dumps({"error": f"Embedding generation failed: {str(e)}"}), file=sys.stderr)
-        return None
+    
+    return embeddings
+
+def _batch_worker(requests):
+    """Load the model, then drain queued requests in micro-batches and answer each one by id"""
+    # Loading takes seconds; doing it on this thread leaves the stdin thread
+    # free to dispatch other tasks (embed requests queue up meanwhile)
+    try:
+        get_model()
+        load_error = None
+    except SystemExit:
+        load_error = "Failed to load embedding model"
+    
+    done = False
+    while not done:
+        item = requests.get()
+        if item is None:
+            return
+        
+        # Wait a little for concurrent requests so they share one forward pass
+        batch = [item]
+        deadline = time.monotonic() + BATCH_WINDOW_SECONDS
+        while len(batch) < BATCH_SIZE:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = requests.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                done = True
+                break
+            batch.append(item)
+        
+        if load_error:
+            for request_id, _ in batch:
+                respond({"id": request_id, "error": load_error})
+            continue
+        
+        embeddings = generate_embeddings([text for _, text in batch])
+        for (request_id, _), embedding in zip(batch, embeddings):
+            if embedding is not None:
+                respond({"id": request_id, "result": quantize_embedding(embedding)})
+            else:
+                respond({"id": request_id, "error": "Failed to generate embedding"})
+
+class EmbeddingBatcher:
+    """
+    Background thread that answers embedding requests in micro-batches
+    
+    Requests submitted within BATCH_WINDOW_SECONDS of each other are encoded
+    together (up to BATCH_SIZE); responses may come back out of order.
+    The model is loaded on the thread, so submit() never blocks on it.
+    """
+    
+    def __init__(self):
+        self.requests = queue.Queue()
+        self.thread = threading.Thread(target=_batch_worker, args=(self.requests,), daemon=True)
+        self.thread.start()
+    
+    def submit(self, request_id, text):
+        self.requests.put((request_id, text))
+    
+    def close(self):
+        """Answer everything still queued, then stop the thread"""
+        self.requests.put(None)
+        self.thread.join()
+
+def serve():
+    """
+    Serve embedding requests as newline-delimited JSON on stdin/stdout
+    
+    Request: {"id": 1, "text": "..."}
+    Response: {"id": 1, "result": {"q": [...], "scale": s}} or {"id": 1, "error": "..."}
+    """
+    batcher = EmbeddingBatcher()
+    
+    def handle(request):
+        batcher.submit(request.get("id"), request.get("text", ""))
+        return DEFERRED
+    
+    serve_stdio(handle)
+    batcher.close()
 
 if __name__ == "__main__":
+    if "--server" in sys.argv[1:]:
+        serve()
+        sys.exit(0)
+
     if len(sys.argv) < 2:
-        result = {"error": "Usage: python embed_text.py <text>"}
+        result = {"error": "Usage: python embed_text.py <text> | --server"}
         print(json.dumps(result))
         sys.exit(1)
     
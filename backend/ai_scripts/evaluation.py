@@ -6,26 +6,27 @@ import sys
 import json
 import numpy as np
 from math import sqrt
+from _kernels import NUMBA_AVAILABLE, metrics_kernel
 
 def mean_absolute_error(actual, predicted):
     """Calculate Mean Absolute Error (MAE)"""
     if len(actual) != len(predicted):
         raise ValueError("Actual and predicted arrays must have the same length")
-    return float(np.mean(np.abs(np.array(actual) - np.array(predicted))))
+    return float(np.mean(np.abs(np.asarray(actual) - np.asarray(predicted))))
 
 def root_mean_squared_error(actual, predicted):
     """Calculate Root Mean Squared Error (RMSE)"""
     if len(actual) != len(predicted):
         raise ValueError("Actual and predicted arrays must have the same length")
-    return float(sqrt(np.mean((np.array(actual) - np.array(predicted)) ** 2)))
+    return float(sqrt(np.mean((np.asarray(actual) - np.asarray(predicted)) ** 2)))
 
 def mean_absolute_percentage_error(actual, predicted):
     """Calculate Mean Absolute Percentage Error (MAPE)"""
     if len(actual) != len(predicted):
         raise ValueError("Actual and predicted arrays must have the same length")
     
-    actual = np.array(actual)
-    predicted = np.array(predicted)
+    actual = np.asarray(actual)
+    predicted = np.asarray(predicted)
     
     # Avoid division by zero
     mask = actual != 0
@@ -34,6 +35,26 @@ def mean_absolute_percentage_error(actual, predicted):
     
     return float(np.mean(np.abs((actual[mask] - predicted[mask]) / actual[mask]) * 100))
 
+def _metrics_numpy(a, p):
+    """NumPy fallback for _kernels.metrics_kernel (same return tuple)"""
+    diff = a - p
+    abs_diff = np.abs(diff)
+    
+    # Avoid division by zero
+    mask = a != 0
+    mape_points = int(mask.sum())
+    mape = float((abs_diff[mask] / np.abs(a[mask])).mean() * 100) if mape_points else 0.0
+    
+    # Compares shifted views directly, so no np.diff temporaries are built
+    if a.size > 1:
+        matches = (a[1:] > a[:-1]) == (p[1:] > p[:-1])  # True if both went up or both did not
+        direction_accuracy = float(matches.mean() * 100)
+    else:
+        direction_accuracy = 0.0
+    
+    return (float(abs_diff.mean()), float(sqrt((diff * diff).mean())), mape, mape_points,
+            direction_accuracy, float(a.mean()), float(p.mean()), float(a.std()), float(p.std()))
+
 def calculate_all_metrics(actual, predicted):
     """
     Calculate all evaluation metrics
@@ -45,41 +66,34 @@ def calculate_all_metrics(actual, predicted):
     Returns:
         dict with MAE, RMSE, MAPE, and additional statistics
     """
-    if len(actual) == 0 or len(predicted) == 0:
+    if actual is None or predicted is None or len(actual) == 0 or len(predicted) == 0:
         return {"error": "Empty arrays provided"}
     
     if len(actual) != len(predicted):
         return {"error": f"Array length mismatch: actual={len(actual)}, predicted={len(predicted)}"}
     
     try:
-        mae = mean_absolute_error(actual, predicted)
-        rmse = root_mean_squared_error(actual, predicted)
-        mape = mean_absolute_percentage_error(actual, predicted)
-        
-        # Additional statistics
-        actual_mean = float(np.mean(actual))
-        predicted_mean = float(np.mean(predicted))
-        actual_std = float(np.std(actual))
-        predicted_std = float(np.std(predicted))
+        # Convert once and derive every metric from the same arrays
+        a = np.ascontiguousarray(actual, dtype=np.float64)
+        p = np.ascontiguousarray(predicted, dtype=np.float64)
+        if not (np.isfinite(a).all() and np.isfinite(p).all()):
+            return {"error": "Arrays must contain only numeric values"}
         
-        # Direction accuracy (how often prediction direction matches actual direction)
-        if len(actual) > 1:
-            actual_directions = np.diff(actual) > 0  # True if price went up
-            predicted_directions = np.diff(predicted) > 0
-            direction_accuracy = float(np.mean(actual_directions == predicted_directions) * 100)
-        else:
-            direction_accuracy = None
+        metrics = metrics_kernel(a, p) if NUMBA_AVAILABLE else _metrics_numpy(a, p)
+        (mae, rmse, mape, mape_points, direction_accuracy,
+         actual_mean, predicted_mean, actual_std, predicted_std) = metrics
         
         return {
-            "MAE": mae,
-            "RMSE": rmse,
-            "MAPE": mape if mape is not None else None,
-            "direction_accuracy": direction_accuracy,
+            "MAE": float(mae),
+            "RMSE": float(rmse),
+            "MAPE": float(mape) if mape_points > 0 else None,
+            # Direction accuracy (how often prediction direction matches actual direction)
+            "direction_accuracy": float(direction_accuracy) if a.size > 1 else None,
             "statistics": {
-                "actual_mean": actual_mean,
-                "predicted_mean": predicted_mean,
-                "actual_std": actual_std,
-                "predicted_std": predicted_std,
+                "actual_mean": float(actual_mean),
+                "predicted_mean": float(predicted_mean),
+                "actual_std": float(actual_std),
+                "predicted_std": float(predicted_std),
                 "data_points": len(actual)
             }
         }
@@ -6,28 +6,52 @@
 # ==========================================================
 
 import sys, json
-import pandas as pd
-from textblob import TextBlob
+import time
+import hashlib
+from collections import OrderedDict
+import numpy as np
+from textblob.sentiments import PatternAnalyzer
+from _kernels import sorted_prices
 
-try:
-    import ta
-except ImportError:
-    print(json.dumps({"error": "Please install the 'ta' library (pip install ta)"}))
-    sys.exit(1)
+# Recent results keyed on (history, news); the same symbol/news pair is often
+# requested by several users within seconds when running as a worker
+HYB_CACHE_TTL_SECONDS = 30
+HYB_CACHE_SIZE = 1024
+_HYB_CACHE = OrderedDict()
+
+# TextBlob's polarity is PatternAnalyzer on the raw text; calling it directly
+# skips building a TextBlob per text
+_PATTERN = PatternAnalyzer()
+
+# Only the latest EMA/RSI values are used, so each one is a single weighted sum
+# over the prices. Same definitions (and values) as ta.trend.ema_indicator /
+# ta.momentum.rsi: adjust=False EWM seeded with the first value, Wilder's
+# alpha=1/window for RSI and RSI=100 when there are no down moves.
+def ewm_last(values, alpha):
+    """Last value of an adjust=False exponential moving average"""
+    weights = (1 - alpha) ** np.arange(values.size - 1, -1, -1, dtype=np.float64)
+    weights[1:] *= alpha
+    return float(weights @ values)
+
+def ema_last(prices, window=20):
+    return ewm_last(prices, 2 / (window + 1))
+
+def rsi_last(prices, window=14):
+    delta = np.diff(prices, prepend=prices[0])
+    ema_up = ewm_last(np.maximum(delta, 0.0), 1 / window)
+    ema_down = ewm_last(np.maximum(-delta, 0.0), 1 / window)
+    if ema_down == 0:
+        return 100.0
+    return 100 - (100 / (1 + ema_up / ema_down))
 
 def analyze_technical(history_data):
-    df = pd.DataFrame(history_data)
-    if 'timestamp' not in df or 'price' not in df:
+    prices = sorted_prices(history_data)
+    if prices is None or not np.isfinite(prices).all():
         return {"ema": None, "rsi": None, "technical_signal": "Invalid input"}
-    df['timestamp'] = pd.to_datetime(df['timestamp'])
-    df = df.sort_values('timestamp')
-    if len(df) < 20:
+    if prices.size < 20:
         return {"ema": None, "rsi": None, "technical_signal": "Insufficient data"}
 
-    df['ema_20'] = ta.trend.ema_indicator(df['price'], window=20)
-    df['rsi_14'] = ta.momentum.rsi(df['price'], window=14)
-    latest = df.iloc[-1]
-    price, ema, rsi = float(latest['price']), float(latest['ema_20']), float(latest['rsi_14'])
+    price, ema, rsi = float(prices[-1]), ema_last(prices, window=20), rsi_last(prices, window=14)
 
     if price > ema and rsi < 70:
         tech = "Bullish"
@@ -39,7 +63,7 @@ def analyze_technical(history_data):
     return {"ema": ema, "rsi": rsi, "technical_signal": tech}
 
 def analyze_sentiment(text):
-    polarity = TextBlob(text).sentiment.polarity
+    polarity = _PATTERN.analyze(text)[0]
     if polarity > 0.1:  label = "Positive"
     elif polarity < -0.1: label = "Negative"
     else: label = "Neutral"
@@ -55,7 +79,25 @@ def hybrid_decision(technical, sent_label):
         return "Hold", "Low"
     return "Hold", "Medium"
 
+def _hybrid_cache_key(history_data, news_text):
+    history_json = json.dumps(history_data, separators=(',', ':'), default=str)
+    return hashlib.blake2b(history_json.encode() + b'|' + news_text.encode('utf-8', 'surrogatepass'), digest_size=16).digest()
+
 def hybrid_analyze(history_data, news_text):
+    key = _hybrid_cache_key(history_data, news_text)
+    now = time.monotonic()
+    cached = _HYB_CACHE.get(key)
+    if cached is not None and now - cached[0] < HYB_CACHE_TTL_SECONDS:
+        return dict(cached[1])
+
+    result = _hybrid_analyze(history_data, news_text)
+    _HYB_CACHE[key] = (now, result)
+    _HYB_CACHE.move_to_end(key)
+    while len(_HYB_CACHE) > HYB_CACHE_SIZE:
+        _HYB_CACHE.popitem(last=False)
+    return dict(result)
+
+def _hybrid_analyze(history_data, news_text):
     tech = analyze_technical(history_data)
     sent_label, sent_score = analyze_sentiment(news_text)
     final, confidence = hybrid_decision(tech, sent_label)
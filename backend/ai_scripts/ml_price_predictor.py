@@ -4,18 +4,28 @@
 # 
 # This script loads models trained by ml_training/scripts/train_price_model.py
 # Models are stored in backend/ai_models/{SYMBOL}_model.pkl with metadata in {SYMBOL}_metadata.json
+#
+# Usage:
+#   python ml_price_predictor.py <symbol> <history_json>   one-shot
+#   python ml_price_predictor.py --server                  long-lived worker, models stay loaded
 
 import sys
 import json
 import os
+import functools
 import pandas as pd
 import numpy as np
 import joblib
 from pathlib import Path
+from _stdio import serve_stdio
+
+# Loaded models by symbol: {symbol: (file_mtimes, model, metadata)}
+# Entries are reloaded when retraining rewrites the files on disk
+_MODEL_CACHE = {}
 
 def load_model(symbol):
     """
-    Load trained model and metadata for a given symbol
+    Load trained model and metadata for a given symbol (cached per process)
     
     Args:
         symbol: Stock symbol (e.g., 'AAPL')
@@ -38,6 +48,11 @@ def load_model(symbol):
         return None, None
     
     try:
+        file_mtimes = (model_path.stat().st_mtime_ns, metadata_path.stat().st_mtime_ns)
+        cached = _MODEL_CACHE.get(symbol)
+        if cached and cached[0] == file_mtimes:
+            return cached[1], cached[2]
+        
         # Load model
         model = joblib.load(model_path)
         
@@ -45,11 +60,72 @@ def load_model(symbol):
         with open(metadata_path, 'r', encoding='utf-8') as f:
             metadata = json.load(f)
         
+        _MODEL_CACHE[symbol] = (file_mtimes, model, metadata)
         return model, metadata
     except Exception as e:
         print(f"Error loading model for {symbol}: {e}", file=sys.stderr)
         return None, None
 
+@functools.lru_cache(maxsize=64)
+def _parse_feature_spec(features):
+    """
+    Parse a model's feature names once into (base column, lag) pairs
+    
+    Args:
+        features: Tuple of feature names from metadata (e.g. "Close_lag1", "Open")
+    
+    Returns:
+        tuple: (lowercased base column, lag number or None) per feature
+    """
+    spec = []
+    for feat_name in features:
+        feat_name_clean = feat_name.strip()
+        
+        # Handle lag features (e.g., "Close_lag1", "Close_lag2")
+        if '_lag' in feat_name_clean:
+            base_col = feat_name_clean.split('_lag')[0]
+            lag_num = int(feat_name_clean.split('_lag')[1])
+            spec.append((base_col.lower(), lag_num))
+        else:
+            spec.append((feat_name_clean.lower(), None))
+    return tuple(spec)
+
+def _resolve_column(base, is_lag, col_map, columns):
+    """Find the DataFrame column for a feature's base name, or None"""
+    # Case-insensitive match (first column wins)
+    col_match = col_map.get(base)
+    if col_match is not None:
+        return col_match
+    
+    # Try common variations
+    if base in ['close', 'close/last']:
+        return 'Close' if 'Close' in columns else 'price'
+    if base in ['open', 'high', 'low', 'volume']:
+        canonical = base.capitalize()
+        if canonical in columns:
+            return canonical
+        # Current-value features fall back to price, lag features to 0.0
+        return None if is_lag else 'price'
+    return None
+
+_PRICE_RECORD_KEYS = {'price', 'timestamp'}
+
+def _is_price_records(history_data):
+    """True for a non-empty list of {price, timestamp} dicts with no OHLCV fields"""
+    return (
+        isinstance(history_data, list) and len(history_data) > 0 and
+        all(isinstance(d, dict) and 'price' in d and d.keys() <= _PRICE_RECORD_KEYS for d in history_data)
+    )
+
+def _price_columns(history_data):
+    """Same columns the DataFrame path builds for price records, as arrays"""
+    closes = np.array([d['price'] for d in history_data], dtype=np.float64)
+    columns = {'price': closes}
+    if any('timestamp' in d for d in history_data):
+        columns['timestamp'] = [d.get('timestamp') for d in history_data]
+    columns.update(Close=closes, Open=closes, High=closes, Low=closes, Volume=np.zeros(closes.size))
+    return columns
+
 def prepare_features(history_data, metadata):
     """
     Prepare feature vector from history data according to model's expected features
@@ -62,102 +138,65 @@ def prepare_features(history_data, metadata):
         numpy array: Feature vector ready for prediction, or None if insufficient data
     """
     try:
-        # Convert to DataFrame
-        if isinstance(history_data, list):
-            df = pd.DataFrame(history_data)
-            # If history_data has 'price' field, we need to construct OHLCV from it
-            if 'price' in df.columns:
-                # Use price as Close, and create dummy Open/High/Low/Volume if needed
-                df['Close'] = df['price']
-                if 'open' not in df.columns:
-                    df['Open'] = df['Close']  # Approximate
-                if 'high' not in df.columns:
-                    df['High'] = df['Close']  # Approximate
-                if 'low' not in df.columns:
-                    df['Low'] = df['Close']  # Approximate
-                if 'volume' not in df.columns:
-                    df['Volume'] = 0  # Default volume
-        else:
-            df = history_data.copy()
-        
-        # Normalize column names (handle various formats)
-        df.columns = df.columns.str.strip()
-        
-        # Get required features from metadata
-        required_features = metadata.get('features', [])
+        # Cheap checks on the raw input before building any arrays
+        spec = _parse_feature_spec(tuple(metadata.get('features', [])))
         lags = metadata.get('lags', 0)
         
-        if len(df) < lags + 1:
+        if not spec:
+            print("Error preparing features: model metadata lists no features", file=sys.stderr)
+            return None
+        
+        if history_data is None or len(history_data) < lags + 1:
             return None  # Insufficient data for lags
         
-        # Get the latest row for current features
-        latest = df.iloc[-1]
+        if _is_price_records(history_data):
+            # Fast path: plain price records don't need a DataFrame
+            columns = _price_columns(history_data)
+        else:
+            # Convert to DataFrame
+            if isinstance(history_data, list):
+                df = pd.DataFrame(history_data)
+                # If history_data has 'price' field, we need to construct OHLCV from it
+                if 'price' in df.columns:
+                    # Use price as Close, and create dummy Open/High/Low/Volume if needed
+                    df['Close'] = df['price']
+                    if 'open' not in df.columns:
+                        df['Open'] = df['Close']  # Approximate
+                    if 'high' not in df.columns:
+                        df['High'] = df['Close']  # Approximate
+                    if 'low' not in df.columns:
+                        df['Low'] = df['Close']  # Approximate
+                    if 'volume' not in df.columns:
+                        df['Volume'] = 0  # Default volume
+            else:
+                df = history_data.copy()
+            
+            # Normalize column names (handle various formats)
+            df.columns = df.columns.str.strip()
+            columns = {col: df[col].to_numpy() for col in df.columns}
+        
+        n_rows = len(history_data)
+        
+        # Index columns once instead of scanning them for every feature
+        col_map = {}
+        for col in columns:
+            col_map.setdefault(col.lower(), col)
         
         # Build feature vector
         feature_vector = []
         
-        for feat_name in required_features:
-            feat_name_clean = feat_name.strip()
+        for base, lag_num in spec:
+            col_match = _resolve_column(base, lag_num is not None, col_map, columns)
+            if col_match is None:
+                feature_vector.append(0.0)
+                continue
             
-            # Handle lag features (e.g., "Close_lag1", "Close_lag2")
-            if '_lag' in feat_name_clean:
-                base_col = feat_name_clean.split('_lag')[0]
-                lag_num = int(feat_name_clean.split('_lag')[1])
-                
-                # Try to find matching column (case-insensitive, handle spaces)
-                col_match = None
-                for col in df.columns:
-                    if col.strip().lower() == base_col.lower():
-                        col_match = col
-                        break
-                
-                if col_match is None:
-                    # Try common variations
-                    if base_col.lower() in ['close', 'close/last']:
-                        col_match = 'Close' if 'Close' in df.columns else 'price'
-                    elif base_col.lower() in ['open']:
-                        col_match = 'Open' if 'Open' in df.columns else None
-                    elif base_col.lower() in ['high']:
-                        col_match = 'High' if 'High' in df.columns else None
-                    elif base_col.lower() in ['low']:
-                        col_match = 'Low' if 'Low' in df.columns else None
-                    elif base_col.lower() in ['volume']:
-                        col_match = 'Volume' if 'Volume' in df.columns else None
-                
-                if col_match and len(df) > lag_num:
-                    lag_value = df[col_match].iloc[-(lag_num + 1)]
-                    feature_vector.append(float(lag_value))
-                else:
-                    # Use latest value as fallback
-                    if col_match:
-                        feature_vector.append(float(latest[col_match]))
-                    else:
-                        feature_vector.append(0.0)
+            column = columns[col_match]
+            if lag_num is not None and n_rows > lag_num:
+                feature_vector.append(float(column[-(lag_num + 1)]))
             else:
-                # Current value feature (e.g., "Open", "High", "Low", "Volume")
-                col_match = None
-                for col in df.columns:
-                    if col.strip().lower() == feat_name_clean.lower():
-                        col_match = col
-                        break
-                
-                if col_match is None:
-                    # Try common variations
-                    if feat_name_clean.lower() in ['open']:
-                        col_match = 'Open' if 'Open' in df.columns else 'price'
-                    elif feat_name_clean.lower() in ['high']:
-                        col_match = 'High' if 'High' in df.columns else 'price'
-                    elif feat_name_clean.lower() in ['low']:
-                        col_match = 'Low' if 'Low' in df.columns else 'price'
-                    elif feat_name_clean.lower() in ['volume']:
-                        col_match = 'Volume' if 'Volume' in df.columns else 'price'
-                    elif feat_name_clean.lower() in ['close', 'close/last']:
-                        col_match = 'Close' if 'Close' in df.columns else 'price'
-                
-                if col_match:
-                    feature_vector.append(float(latest[col_match]))
-                else:
-                    feature_vector.append(0.0)
+                # Current value (or latest value as fallback for long lags)
+                feature_vector.append(float(column[-1]))
         
         return np.array(feature_vector).reshape(1, -1)
     
@@ -165,6 +204,16 @@ def prepare_features(history_data, metadata):
         print(f"Error preparing features: {e}", file=sys.stderr)
         return None
 
+def as_model_input(model, feature_vector):
+    """
+    Contiguous input in the dtype the model evaluates in
+    
+    sklearn tree ensembles predict on float32 internally, so converting up
+    front skips their per-call copy; other models keep float64 precision
+    """
+    dtype = np.float32 if hasattr(model, 'estimators_') else np.float64
+    return np.ascontiguousarray(feature_vector, dtype=dtype)
+
 def predict_price(symbol, history_data):
     """
     Predict next price using trained ML model
@@ -176,30 +225,86 @@ def predict_price(symbol, history_data):
     Returns:
         dict: Prediction result with predicted_price, confidence, and metadata
     """
-    # Load model and metadata
-    model, metadata = load_model(symbol)
+    return predict_batch([{"symbol": symbol, "history": history_data}])[0]
+
+def predict_batch(requests):
+    """
+    Predict next price for several symbols, with one predict() call per model
     
-    if model is None or metadata is None:
-        return {
-            "error": f"No trained model found for symbol {symbol}",
-            "available": False
-        }
+    Args:
+        requests: List of {"symbol": ..., "history": ...} dicts
     
-    # Prepare features
-    feature_vector = prepare_features(history_data, metadata)
+    Returns:
+        list: Prediction results in request order (same format as predict_price)
+    """
+    results = [None] * len(requests)
     
-    if feature_vector is None:
-        return {
-            "error": "Insufficient historical data to prepare features",
-            "available": True,
-            "model_type": metadata.get('model_type'),
-            "required_lags": metadata.get('lags', 0)
-        }
+    by_symbol = {}
+    for i, request in enumerate(requests):
+        by_symbol.setdefault(request['symbol'], []).append(i)
     
-    try:
-        # Make prediction
-        predicted_price = model.predict(feature_vector)[0]
+    for symbol, indices in by_symbol.items():
+        # Load model and metadata
+        model, metadata = load_model(symbol)
+        
+        if model is None or metadata is None:
+            for i in indices:
+                results[i] = {
+                    "error": f"No trained model found for symbol {symbol}",
+                    "available": False
+                }
+            continue
         
+        if not metadata.get('features'):
+            # A bad metadata file, not the caller's history
+            for i in indices:
+                results[i] = {
+                    "error": "Model metadata lists no features",
+                    "available": True,
+                    "model_type": metadata.get('model_type')
+                }
+            continue
+        
+        # Prepare features
+        rows, row_indices = [], []
+        for i in indices:
+            feature_vector = prepare_features(requests[i]['history'], metadata)
+            if feature_vector is None:
+                results[i] = {
+                    "error": "Insufficient historical data to prepare features",
+                    "available": True,
+                    "model_type": metadata.get('model_type'),
+                    "required_lags": metadata.get('lags', 0)
+                }
+            else:
+                rows.append(feature_vector)
+                row_indices.append(i)
+        
+        if not rows:
+            continue
+        
+        try:
+            # Make predictions; only a real batch is worth fanning out over threads
+            if hasattr(model, 'n_jobs'):
+                model.n_jobs = -1 if len(rows) > 1 else 1
+            predicted_prices = model.predict(as_model_input(model, np.vstack(rows)))
+        except Exception as e:
+            for i in row_indices:
+                results[i] = {
+                    "error": f"Prediction failed: {str(e)}",
+                    "available": True,
+                    "model_type": metadata.get('model_type')
+                }
+            continue
+        
+        for i, predicted_price in zip(row_indices, predicted_prices):
+            results[i] = _prediction_result(requests[i]['history'], metadata, predicted_price)
+    
+    return results
+
+def _prediction_result(history_data, metadata, predicted_price):
+    """Turn a raw model prediction into the result dict (change, trend, confidence)"""
+    try:
         # Get model metrics for confidence estimation
         metrics = metadata.get('metrics', {})
         rmse = metrics.get('RMSE', None)
@@ -210,7 +315,8 @@ def predict_price(symbol, history_data):
         if isinstance(history_data, list) and len(history_data) > 0:
             current_price = history_data[-1].get('price', history_data[-1].get('Close', 0))
         else:
-            current_price = history_data.iloc[-1].get('price', history_data.iloc[-1].get('Close', 0))
+            last_row = history_data.iloc[-1]
+            current_price = last_row.get('price', last_row.get('Close', 0))
         
         if current_price > 0 and rmse:
             # Confidence = 1 - (RMSE / current_price), capped at reasonable range
@@ -256,10 +362,28 @@ def predict_price(symbol, history_data):
             "model_type": metadata.get('model_type')
         }
 
+def handle_request(request):
+    """
+    Server mode handler
+    
+    {"symbol": ..., "history": [...]} returns one prediction;
+    {"requests": [{"symbol": ..., "history": [...]}, ...]} returns a list
+    """
+    if 'requests' in request:
+        return predict_batch([
+            {"symbol": str(r.get('symbol', '')).upper(), "history": r.get('history', [])}
+            for r in request['requests']
+        ])
+    return predict_price(str(request.get('symbol', '')).upper(), request.get('history', []))
+
 if __name__ == "__main__":
+    if "--server" in sys.argv[1:]:
+        serve_stdio(handle_request)
+        sys.exit(0)
+    
     if len(sys.argv) < 3:
         result = {
-            "error": "Usage: python ml_price_predictor.py <symbol> <history_json>"
+            "error": "Usage: python ml_price_predictor.py <symbol> <history_json> | --server"
         }
         print(json.dumps(result))
         sys.exit(1)
@@ -5,34 +5,138 @@
 # - Added ARIMA for short-term prediction (1-7 days)
 # - Added Prophet for long-term trend (1-3 months)
 # - Kept SMA as baseline for comparison
+#
+# Usage:
+#   python price_analyzer.py <history_json> [options]   one-shot
+#   python price_analyzer.py --server [options]         long-lived worker, imports paid once
+#   --no-cache        refit ARIMA/Prophet instead of reusing models cached on disk
+#   --accurate-arima  fit ARIMA with statsmodels (MLE) instead of the numba kernel
+#   --force-prophet   run Prophet even when the SMA_50 trend is already strong
+#
+# Server requests: {"history": [...], "no_cache"?, "accurate_arima"?, "force_prophet"?}
+# (the options default to the command line flags)
 
 import sys
-import json
-import pandas as pd
+import os
+import hashlib
+import functools
+import importlib.util
 import numpy as np
+from _kernels import NUMBA_AVAILABLE, arima_111_forecast, rolling_mean_tail, sorted_history
+from _stdio import dumps, loads, serve_stdio
 
-# Try to import ARIMA (statsmodels)
-try:
-    from statsmodels.tsa.arima.model import ARIMA
-    ARIMA_AVAILABLE = True
-except ImportError:
-    ARIMA_AVAILABLE = False
+# statsmodels (~0.3 s) and Prophet (~0.6 s) are only imported when a forecast
+# needs them; find_spec checks they are installed without running them
+ARIMA_AVAILABLE = importlib.util.find_spec('statsmodels') is not None
+if not ARIMA_AVAILABLE:
     print("Warning: ARIMA not available. Install with: pip install statsmodels", file=sys.stderr)
 
-# Try to import Prophet
-try:
-    from prophet import Prophet
-    PROPHET_AVAILABLE = True
-except ImportError:
-    PROPHET_AVAILABLE = False
+PROPHET_AVAILABLE = importlib.util.find_spec('prophet') is not None
+if not PROPHET_AVAILABLE:
     print("Warning: Prophet not available. Install with: pip install prophet", file=sys.stderr)
 
-def analyze_price_history(history_data):
-    df = pd.DataFrame(history_data)
-    df['timestamp'] = pd.to_datetime(df['timestamp'])
-    df = df.set_index('timestamp').sort_index()
+@functools.lru_cache(maxsize=1)
+def _import_arima():
+    """statsmodels' ARIMA module, imported on first use"""
+    import statsmodels.tsa.arima.model
+    return statsmodels.tsa.arima.model
 
-    if len(df) < 50: # Cần ít nhất 50 điểm dữ liệu cho MA dài hạn 50 ngày
+@functools.lru_cache(maxsize=1)
+def _import_prophet():
+    """The prophet package (with prophet.serialize), imported on first use"""
+    import prophet
+    import prophet.serialize
+    return prophet
+
+# Fitted ARIMA/Prophet models are cached on disk, keyed by a hash of the input
+# series, so re-running on the same history only pays for the forecast
+MODEL_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'capstock')
+MODEL_CACHE_SIZE = 50  # Entries kept per model type (least recently used evicted)
+
+# Skip Prophet when SMA_50 moved more than this fraction over the last 50 days;
+# the long-term trend is clear from the SMA alone (unless force_prophet)
+STRONG_TREND_SLOPE = 0.15
+
+# Compile (or load from numba's cache) before the first real request
+if NUMBA_AVAILABLE:
+    rolling_mean_tail(np.zeros(60), 10, 1)
+    arima_111_forecast(np.arange(60, dtype=np.float64), 7)
+
+def _model_cache_path(kind, prices, timestamps, params=''):
+    """Cache file for a model fitted on exactly these prices/timestamps"""
+    key = hashlib.sha1(np.ascontiguousarray(prices, dtype=np.float64).tobytes())
+    key.update(np.ascontiguousarray(timestamps, dtype=np.int64).tobytes())
+    key.update(params.encode())
+    extension = 'json' if kind == 'prophet' else 'pkl'
+    return os.path.join(MODEL_CACHE_DIR, kind, f"{key.hexdigest()}.{extension}")
+
+def _load_cached_model(path, load):
+    """Load a cached model (None on a miss) and mark it as recently used"""
+    if not os.path.exists(path):
+        return None
+    try:
+        model = load(path)
+        os.utime(path)
+        return model
+    except Exception as e:
+        print(f"Ignoring unreadable model cache {path}: {e}", file=sys.stderr)
+        return None
+
+def _store_cached_model(path, save):
+    """Write a cache entry atomically, then evict the least recently used ones"""
+    try:
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        save(tmp_path)
+        os.replace(tmp_path, path)
+        
+        entries = [e for e in os.scandir(directory) if not e.name.endswith('.tmp')]
+        entries.sort(key=lambda e: e.stat().st_mtime)
+        for entry in entries[:-MODEL_CACHE_SIZE]:
+            os.remove(entry.path)
+    except Exception as e:
+        print(f"Failed to cache model: {e}", file=sys.stderr)
+
+def _save_prophet(model, path):
+    with open(path, 'w') as f:
+        f.write(_import_prophet().serialize.model_to_json(model))
+
+def _load_prophet(path):
+    with open(path, 'r') as f:
+        return _import_prophet().serialize.model_from_json(f.read())
+
+def _sma_tail(prices, window, count):
+    """
+    NumPy equivalent of rolling_mean_tail: the last `count` rolling means
+    from cumulative-sum differences over just the tail (NaN while a NaN
+    price is inside the window)
+    """
+    tail = prices[-(window + count - 1):]
+    missing = np.isnan(tail)
+    cs = np.concatenate(([0.0], np.cumsum(np.where(missing, 0.0, tail))))
+    cn = np.concatenate(([0], np.cumsum(missing)))
+    means = (cs[window:] - cs[:-window]) / window
+    means[cn[window:] - cn[:-window] > 0] = np.nan
+    return means
+
+def analyze_price_history(history_data, no_cache=False, accurate_arima=False, force_prophet=False):
+    """
+    SMA trends plus ARIMA (short-term) and Prophet (long-term) forecasts
+    
+    Args:
+        history_data: List of {price, timestamp} dicts
+        no_cache: Refit ARIMA/Prophet instead of reusing models cached on disk
+        accurate_arima: Fit ARIMA with statsmodels (MLE) instead of the numba kernel
+        force_prophet: Run Prophet even when the SMA_50 trend is already strong
+    """
+    # Work on plain arrays; only Prophet needs a DataFrame
+    history = sorted_history(history_data)
+    if history is None:
+        raise ValueError("Each history record needs a price and timestamp")
+    timestamps, prices = history
+
+    if len(prices) < 50: # Cần ít nhất 50 điểm dữ liệu cho MA dài hạn 50 ngày
         return {
             "short_term_trend": "Insufficient data",
             "long_term_trend": "Insufficient data",
@@ -41,11 +145,13 @@ def analyze_price_history(history_data):
         }
 
     # Calculate Moving Averages
-    df['SMA_10'] = df['price'].rolling(window=10).mean()
-    df['SMA_50'] = df['price'].rolling(window=50).mean()
-
-    latest_sma_10 = df['SMA_10'].iloc[-1]
-    latest_sma_50 = df['SMA_50'].iloc[-1]
+    # Only the latest SMA_10/SMA_50 and the SMA_50 of 50 days ago are used,
+    # so compute just those instead of rolling over the whole series
+    sma_tail = rolling_mean_tail if NUMBA_AVAILABLE else _sma_tail
+    sma_50 = sma_tail(prices, 50, 50 if len(prices) > 100 else 1)
+    latest_sma_10 = float(sma_tail(prices, 10, 1)[-1])
+    latest_sma_50 = float(sma_50[-1])
+    sma_50_old = sma_50[0]
 
     short_term_trend = "Neutral"
     if latest_sma_10 > latest_sma_50:
@@ -56,10 +162,11 @@ def analyze_price_history(history_data):
     # Long term trend can be based on the overall slope of SMA_50 or a longer MA
     # For simplicity, let's use the current value of SMA_50 vs. earlier value
     long_term_trend = "Neutral"
-    if len(df) > 100: # Need more data for a more stable long-term trend
-        if df['SMA_50'].iloc[-1] > df['SMA_50'].iloc[-50]: # Compare current SMA_50 with 50 days ago
+    if len(prices) > 100: # Need more data for a more stable long-term trend
+        # sma_50_old is SMA_50 as of 50 days ago
+        if latest_sma_50 > sma_50_old: # Compare current SMA_50 with 50 days ago
             long_term_trend = "Bullish"
-        elif df['SMA_50'].iloc[-1] < df['SMA_50'].iloc[-50]:
+        elif latest_sma_50 < sma_50_old:
             long_term_trend = "Bearish"
 
     result = {
@@ -71,9 +178,9 @@ def analyze_price_history(history_data):
     }
 
     # Add ARIMA prediction for short-term (1-7 days) if available
-    if ARIMA_AVAILABLE and len(df) >= 30:
+    if (NUMBA_AVAILABLE or ARIMA_AVAILABLE) and len(prices) >= 30:
         try:
-            arima_forecast = predict_with_arima(df['price'], days=7)
+            arima_forecast = predict_with_arima(prices, timestamps, days=7, accurate=accurate_arima, use_cache=not no_cache)
             if arima_forecast:
                 result["arima_forecast"] = arima_forecast
                 result["arima_short_term_trend"] = arima_forecast.get("trend", "Neutral")
@@ -81,9 +188,15 @@ def analyze_price_history(history_data):
             print(f"ARIMA prediction failed: {e}", file=sys.stderr)
 
     # Add Prophet prediction for long-term (1-3 months) if available
-    if PROPHET_AVAILABLE and len(df) >= 60:
+    strong_trend = (
+        len(prices) > 100 and sma_50_old != 0
+        and abs(latest_sma_50 - sma_50_old) / abs(sma_50_old) > STRONG_TREND_SLOPE
+    )
+    if PROPHET_AVAILABLE and len(prices) >= 60 and strong_trend and not force_prophet:
+        result["prophet_skipped"] = "strong SMA trend"
+    elif PROPHET_AVAILABLE and len(prices) >= 60:
         try:
-            prophet_forecast = predict_with_prophet(df, days=90)
+            prophet_forecast = predict_with_prophet(prices, timestamps, days=90, use_cache=not no_cache)
             if prophet_forecast:
                 result["prophet_forecast"] = prophet_forecast
                 result["prophet_long_term_trend"] = prophet_forecast.get("trend", "Neutral")
@@ -92,23 +205,45 @@ def analyze_price_history(history_data):
 
     return result
 
-def predict_with_arima(price_series, days=7):
-    """Predict short-term price using ARIMA model"""
-    if not ARIMA_AVAILABLE:
+def predict_with_arima(prices, timestamps, days=7, accurate=False, use_cache=True):
+    """
+    Predict short-term price using ARIMA model (prices as a float64 array in time order)
+    
+    ARIMA(1,1,1) forecasts come from the moment-matching numba kernel unless
+    the statsmodels MLE fit is requested with accurate (or numba is missing).
+    """
+    use_kernel = NUMBA_AVAILABLE and not accurate
+    if not use_kernel and not ARIMA_AVAILABLE:
         return None
     
     try:
-        # Fit ARIMA model (auto-select order)
-        model = ARIMA(price_series, order=(1, 1, 1))
-        fitted_model = model.fit()
-        
-        # Forecast next 'days' periods
-        forecast = fitted_model.forecast(steps=days)
-        forecast_values = forecast.tolist()
+        if use_kernel:
+            # Forecast next 'days' periods with the fixed-order ARIMA(1,1,1) kernel;
+            # it has no notion of missing values, so null prices (NaN) are skipped
+            # (statsmodels treats them as missing observations)
+            observed = prices[~np.isnan(prices)]
+            if observed.size < 2:
+                return None
+            forecast_values = arima_111_forecast(observed, days)
+        else:
+            # Fit ARIMA model (auto-select order), or reuse one fitted on the same series
+            arima = _import_arima()
+            order = (1, 1, 1)
+            cache_path = _model_cache_path('arima', prices, timestamps.view(np.int64), str(order))
+            fitted_model = _load_cached_model(cache_path, arima.ARIMAResults.load) if use_cache else None
+            if fitted_model is None:
+                model = arima.ARIMA(prices, order=order)
+                fitted_model = model.fit()
+                if use_cache:
+                    _store_cached_model(cache_path, fitted_model.save)
+            
+            # Forecast next 'days' periods
+            forecast = fitted_model.forecast(steps=days)
+            forecast_values = np.asarray(forecast, dtype=np.float64)
         
         # Determine trend based on forecast direction
-        current_price = price_series.iloc[-1]
-        avg_forecast = np.mean(forecast_values)
+        current_price = prices[-1]
+        avg_forecast = forecast_values.mean()
         
         if avg_forecast > current_price * 1.02:  # 2% increase threshold
             trend = "Bullish"
@@ -119,7 +254,7 @@ def predict_with_arima(price_series, days=7):
         
         return {
             "forecast_days": days,
-            "forecast_values": [float(v) for v in forecast_values],
+            "forecast_values": forecast_values.tolist(),
             "current_price": float(current_price),
             "forecast_avg": float(avg_forecast),
             "forecast_change_pct": float((avg_forecast - current_price) / current_price * 100),
@@ -129,25 +264,35 @@ def predict_with_arima(price_series, days=7):
         print(f"ARIMA error: {e}", file=sys.stderr)
         return None
 
-def predict_with_prophet(df, days=90):
-    """Predict long-term trend using Prophet model"""
+def predict_with_prophet(prices, timestamps, days=90, use_cache=True):
+    """Predict long-term trend using Prophet model (prices/datetime64 timestamps in time order)"""
     if not PROPHET_AVAILABLE:
         return None
     
     try:
-        # Prepare data for Prophet (requires 'ds' and 'y' columns)
+        # Prepare data for Prophet (requires 'ds' and 'y' columns); pandas is
+        # only imported here, Prophet loads it anyway
+        import pandas as pd
         prophet_df = pd.DataFrame({
-            'ds': df.index,
-            'y': df['price'].values
+            'ds': timestamps,
+            'y': prices
         })
         
-        # Fit Prophet model
-        model = Prophet(
-            yearly_seasonality=False,  # Disable yearly for shorter datasets
-            weekly_seasonality=True,
-            daily_seasonality=False
-        )
-        model.fit(prophet_df)
+        # Fit Prophet model, or reuse one fitted on the same series
+        cache_path = _model_cache_path('prophet', prices, timestamps.view(np.int64), 'uncertainty_samples=0')
+        model = _load_cached_model(cache_path, _load_prophet) if use_cache else None
+        if model is None:
+            model = _import_prophet().Prophet(
+                yearly_seasonality=False,  # Disable yearly for shorter datasets
+                weekly_seasonality=True,
+                daily_seasonality=False,
+                # Only yhat is used: skip the posterior draws behind yhat_lower/yhat_upper
+                uncertainty_samples=0
+            )
+            # MAP fit (no mcmc_samples); the backend already picks Newton/L-BFGS by series length
+            model.fit(prophet_df)
+            if use_cache:
+                _store_cached_model(cache_path, lambda path: _save_prophet(model, path))
         
         # Create future dataframe
         future = model.make_future_dataframe(periods=days)
@@ -155,11 +300,11 @@ def predict_with_prophet(df, days=90):
         
         # Get forecast values
         forecast_tail = forecast.tail(days)
-        forecast_values = forecast_tail['yhat'].tolist()
+        forecast_values = forecast_tail['yhat'].to_numpy(dtype=np.float64)
         
         # Determine trend
-        current_price = df['price'].iloc[-1]
-        avg_forecast = np.mean(forecast_values)
+        current_price = prices[-1]
+        avg_forecast = forecast_values.mean()
         
         if avg_forecast > current_price * 1.05:  # 5% increase threshold for long-term
             trend = "Bullish"
@@ -174,17 +319,43 @@ def predict_with_prophet(df, days=90):
             "current_price": float(current_price),
             "forecast_change_pct": float((avg_forecast - current_price) / current_price * 100),
             "trend": trend,
-            "forecast_values": [float(v) for v in forecast_values[:10]]  # Return first 10 for brevity
+            "forecast_values": forecast_values[:10].tolist()  # Return first 10 for brevity
         }
     except Exception as e:
         print(f"Prophet error: {e}", file=sys.stderr)
         return None
 
+def handle_request(request, no_cache=False, accurate_arima=False, force_prophet=False):
+    """
+    Server mode handler: {"history": [...]} -> price analysis
+    
+    The request may set "no_cache", "accurate_arima" and "force_prophet";
+    the keyword arguments are the defaults for requests that don't.
+    """
+    return analyze_price_history(
+        request.get('history', []),
+        no_cache=bool(request.get('no_cache', no_cache)),
+        accurate_arima=bool(request.get('accurate_arima', accurate_arima)),
+        force_prophet=bool(request.get('force_prophet', force_prophet))
+    )
+
 if __name__ == "__main__":
-    if len(sys.argv) > 1:
-        history_json = sys.argv[1]
-        history_data = json.loads(history_json)
-        analysis_result = analyze_price_history(history_data)
-        print(json.dumps(analysis_result))
+    options = {
+        "no_cache": "--no-cache" in sys.argv[1:],
+        "accurate_arima": "--accurate-arima" in sys.argv[1:],
+        "force_prophet": "--force-prophet" in sys.argv[1:]
+    }
+    
+    if "--server" in sys.argv[1:]:
+        serve_stdio(functools.partial(handle_request, **options))
+        sys.exit(0)
+    
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    
+    if args:
+        history_json = args[0]
+        history_data = loads(history_json)
+        analysis_result = analyze_price_history(history_data, **options)
+        print(dumps(analysis_result))
     else:
-        print(json.dumps({"error": "Please provide history data as a JSON argument."}), file=sys.stderr)
+        print(dumps({"error": "Please provide history data as a JSON argument."}), file=sys.stderr)
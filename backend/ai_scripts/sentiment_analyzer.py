@@ -5,10 +5,14 @@
 # - Added VADER sentiment analyzer support
 # - Added method selection (TextBlob or VADER)
 # - Returns both label and score for better analysis
+#
+# Usage:
+#   python sentiment_analyzer.py <text> [method]   one-shot
+#   python sentiment_analyzer.py --server          long-lived worker, analyzers stay loaded
 
 import sys
-import json
-from textblob import TextBlob
+from textblob.sentiments import PatternAnalyzer
+from _stdio import dumps, serve_stdio
 
 # Try to import VADER, fallback to TextBlob if not available
 try:
@@ -18,10 +22,16 @@ except ImportError:
     VADER_AVAILABLE = False
     print("Warning: VADER not available. Install with: pip install vaderSentiment", file=sys.stderr)
 
+# Build the VADER analyzer (and parse its lexicon) once, not on every call
+_VADER = SentimentIntensityAnalyzer() if VADER_AVAILABLE else None
+
+# TextBlob's polarity is PatternAnalyzer on the raw text; calling it directly
+# skips building a TextBlob per text
+_PATTERN = PatternAnalyzer()
+
 def analyze_with_textblob(text):
     """Analyze sentiment using TextBlob"""
-    analysis = TextBlob(text)
-    polarity = analysis.sentiment.polarity
+    polarity = _PATTERN.analyze(text)[0]
     
     if polarity > 0.1:
         label = "Positive"
@@ -38,10 +48,10 @@ def analyze_with_textblob(text):
 
 def analyze_with_vader(text):
     """Analyze sentiment using VADER (better for social media and financial text)"""
-    if not VADER_AVAILABLE:
+    analyzer = _VADER
+    if analyzer is None:
         return None
     
-    analyzer = SentimentIntensityAnalyzer()
     scores = analyzer.polarity_scores(text)
     
     compound = scores['compound']
@@ -84,9 +94,38 @@ def analyze_sentiment(text, method="auto"):
     # Fallback to TextBlob
     return analyze_with_textblob(text)
 
+def analyze_sentiment_batch(texts, method="auto"):
+    """
+    Analyze several texts in one call (one worker request instead of one per text)
+    
+    Args:
+        texts: List of texts to analyze
+        method: "textblob", "vader", or "auto" (default: auto)
+    
+    Returns:
+        list of result dicts in input order (same format as analyze_sentiment)
+    """
+    return [analyze_sentiment(text, method) for text in texts]
+
+def handle_request(request):
+    """
+    Server mode handler
+    
+    {"text": ..., "method": ...} returns one result;
+    {"texts": [...], "method": ...} returns a list
+    """
+    method = request.get('method') or "auto"
+    if 'texts' in request:
+        return analyze_sentiment_batch(request['texts'], method)
+    return analyze_sentiment(request.get('text', ''), method)
+
 if __name__ == "__main__":
+    if "--server" in sys.argv[1:]:
+        serve_stdio(handle_request)
+        sys.exit(0)
+    
     if len(sys.argv) < 2:
-        print(json.dumps({"error": "Please provide text as an argument."}), file=sys.stderr)
+        print(dumps({"error": "Please provide text as an argument."}), file=sys.stderr)
         sys.exit(1)
     
     text_to_analyze = sys.argv[1]
@@ -95,7 +134,7 @@ if __name__ == "__main__":
     try:
         result = analyze_sentiment(text_to_analyze, method)
         # Output as JSON for better parsing
-        print(json.dumps(result))
+        print(dumps(result))
     except Exception as e:
-        print(json.dumps({"error": str(e)}), file=sys.stderr)
+        print(dumps({"error": str(e)}), file=sys.stderr)
         sys.exit(1)
@@ -14,56 +14,27 @@
 const path = require('path');
 require('dotenv').config({ path: path.join(__dirname, '..', '.env') });
 const mongoose = require('mongoose');
-const { spawn } = require('child_process');
 const Article = require('../models/Article');
 const pineconeService = require('../services/pineconeService');
-
-const EMBEDDING_SCRIPT = path.join(__dirname, '..', 'ai_scripts', 'embed_text.py');
+const { runAITask, dequantizeEmbedding } = require('../services/pythonWorkerService');
 
 /**
- * Generate embedding for text using Python script
+ * Generate embedding for text using the persistent Python AI worker
  * @param {string} text - Text to embed
  * @returns {Promise<Array<number>|null>} Embedding vector
  */
-function generateEmbedding(text) {
-  return new Promise((resolve, reject) => {
-    const pythonProcess = spawn('python', [EMBEDDING_SCRIPT, text]);
-    let stdout = '';
-    let stderr = '';
-
-    pythonProcess.stdout.on('data', (data) => {
-      stdout += data.toString();
-    });
-
-    pythonProcess.stderr.on('data', (data) => {
-      stderr += data.toString();
-    });
-
-    pythonProcess.on('close', (code) => {
-      if (code !== 0) {
-        console.error(`Embedding script error: ${stderr}`);
-        return resolve(null);
-      }
-
-      try {
-        const embedding = JSON.parse(stdout.trim());
-        if (Array.isArray(embedding) && embedding.length === 384) {
-          resolve(embedding);
-        } else {
-          console.error('Invalid embedding format');
-          resolve(null);
-        }
-      } catch (e) {
-        console.error('Failed to parse embedding:', e.message);
-        resolve(null);
-      }
-    });
-
-    pythonProcess.on('error', (err) => {
-      console.error('Failed to start Python process:', err);
-      resolve(null);
-    });
-  });
+async function generateEmbedding(text) {
+  try {
+    const embedding = dequantizeEmbedding(await runAITask('embed', { text }));
+    if (Array.isArray(embedding) && embedding.length === 384) {
+      return embedding;
+    }
+    console.error('Invalid embedding format');
+    return null;
+  } catch (error) {
+    console.error(`Embedding script error: ${error.message}`);
+    return null;
+  }
 }
 
 /**
@@ -4,11 +4,17 @@
   - Ollama local AI service using llama3.1:8b model (LLM)
   - Python ML analysis scripts (sentiment, price, hybrid analysis)
   No API key required - runs locally
+
+  CHANGES (2025-12-08):
+  - Python analysis runs on the persistent AI worker (runAITask) instead of
+    spawning a Python process per call
+  - analyzePriceHistoryEnhanced() forwards price analysis options
+    (force_prophet, accurate_arima, no_cache) to the worker
 */
 
 const fetch = require("node-fetch");
-const { spawn } = require('child_process');
 const path = require('path');
+const { runAITask } = require('./pythonWorkerService');
 
 const OLLAMA_URL = process.env.OLLAMA_URL || "http://localhost:11434";
 const OLLAMA_MODEL = process.env.OLLAMA_MODEL || "llama3.1:8b";
@@ -72,44 +78,7 @@ async function sendMessage(message, systemPrompt = null) {
 }
 
 /**
- * Run Python script and return JSON result
- * @param {string} scriptPath - Path to Python script
- * @param {Array<string>} args - Arguments to pass to script
- * @returns {Promise<Object>} Parsed JSON result
- */
-function runPythonScript(scriptPath, args = []) {
-  return new Promise((resolve, reject) => {
-    const pythonProcess = spawn('python', [scriptPath, ...args]);
-    
-    let output = '';
-    let errorOutput = '';
-    
-    pythonProcess.stdout.on('data', (data) => {
-      output += data.toString();
-    });
-    
-    pythonProcess.stderr.on('data', (data) => {
-      errorOutput += data.toString();
-    });
-    
-    pythonProcess.on('close', (code) => {
-      if (code !== 0) {
-        reject(new Error(`Python script failed with code ${code}: ${errorOutput}`));
-        return;
-      }
-      
-      try {
-        const result = JSON.parse(output.trim());
-        resolve(result);
-      } catch (parseError) {
-        reject(new Error(`Failed to parse Python output: ${output}`));
-      }
-    });
-  });
-}
-
-/**
- * Analyze sentiment of text using Python script
+ * Analyze sentiment of text using the persistent Python AI worker
  * @param {string} text - Text to analyze
  * @param {string} method - Analysis method: "textblob", "vader", or "auto"
  * @returns {Promise<Object>} Sentiment result with label, score, method
@@ -124,8 +93,7 @@ async function getSentiment(text, method = "auto") {
   }
 
   try {
-    const scriptPath = path.join(__dirname, '..', 'ai_scripts', 'sentiment_analyzer.py');
-    const result = await runPythonScript(scriptPath, [text, method]);
+    const result = await runAITask('sentiment', { text, method });
     
     if (result.error) {
       throw new Error(result.error);
@@ -151,11 +119,10 @@ async function getSentiment(text, method = "auto") {
  */
 async function analyzeHybrid(historyData, newsText) {
   try {
-    const scriptPath = path.join(__dirname, '..', 'ai_scripts', 'hybrid_analyzer.py');
-    const historyJson = JSON.stringify(historyData);
-    const newsTextSafe = newsText || '';
-    
-    const result = await runPythonScript(scriptPath, [historyJson, newsTextSafe]);
+    const result = await runAITask('hybrid', {
+      history: historyData,
+      news_text: newsText || ''
+    });
     
     if (result.error) {
       throw new Error(result.error);
@@ -172,20 +139,23 @@ async function analyzeHybrid(historyData, newsText) {
  * Analyze price history with ML or traditional methods
  * @param {string} symbol - Stock symbol
  * @param {Array} historyData - Array of {price, timestamp} objects
+ * @param {Object} options - Optional {force_prophet, accurate_arima, no_cache} for the traditional analysis
  * @returns {Promise<Object>} Price analysis result
  */
-async function analyzePriceHistoryEnhanced(symbol, historyData) {
+async function analyzePriceHistoryEnhanced(symbol, historyData, options = {}) {
   try {
     // Try ML model first
-    const mlPredictorPath = path.join(__dirname, '..', 'ai_scripts', 'ml_price_predictor.py');
     const fs = require('fs');
     
     // Check if ML model exists
     const modelPath = path.join(__dirname, '..', 'ai_models', `price_model_${symbol.toUpperCase()}.pkl`);
     if (fs.existsSync(modelPath)) {
       try {
-        const historyJson = JSON.stringify(historyData);
-        const result = await runPythonScript(mlPredictorPath, [symbol, historyJson]);
+        // Persistent worker keeps loaded models in memory between requests
+        const result = await runAITask('predict', {
+          symbol: symbol.toUpperCase(),
+          history: historyData
+        });
         if (result && !result.error) {
           return result;
         }
@@ -195,9 +165,7 @@ async function analyzePriceHistoryEnhanced(symbol, historyData) {
     }
     
     // Fallback to traditional analysis
-    const scriptPath = path.join(__dirname, '..', 'ai_scripts', 'price_analyzer.py');
-    const historyJson = JSON.stringify(historyData);
-    const result = await runPythonScript(scriptPath, [historyJson]);
+    const result = await runAITask('price', { ...options, history: historyData });
     
     if (result.error) {
       throw new Error(result.error);
@@ -218,11 +186,7 @@ async function analyzePriceHistoryEnhanced(symbol, historyData) {
  */
 async function calculateEvaluationMetrics(actual, predicted) {
   try {
-    const scriptPath = path.join(__dirname, '..', 'ai_scripts', 'evaluation.py');
-    const actualJson = JSON.stringify(actual);
-    const predictedJson = JSON.stringify(predicted);
-    
-    const result = await runPythonScript(scriptPath, [actualJson, predictedJson]);
+    const result = await runAITask('evaluate', { actual, predicted });
     
     if (result.error) {
       throw new Error(result.error);
@@ -0,0 +1,234 @@
+/*
+  File: services/pythonWorkerService.js
+  Purpose: Keep long-lived Python worker processes for the ai_scripts
+  Avoids paying interpreter startup + model loading on every request
+
+  CHANGES (2025-12-08):
+  - Initial creation for persistent embedding worker
+  - Newline-delimited JSON protocol: {id, ...payload} -> {id, result|error}
+  - Worker is spawned lazily and respawned on next request if it dies
+  - runAITask() routes every AI script task through one ai_worker.py process
+  - Embeddings arrive int8-quantized ({q, scale}); dequantizeEmbedding() expands them
+  - Requests time out, and output that can't be matched to a request
+    (unparseable line, error with id null) fails the pending requests
+*/
+
+const { spawn } = require('child_process');
+const path = require('path');
+const readline = require('readline');
+
+const AI_SCRIPTS_DIR = path.join(__dirname, '..', 'ai_scripts');
+
+// Longest wait for one response (first requests also pay for model loading)
+const REQUEST_TIMEOUT_MS = parseInt(process.env.PYTHON_WORKER_TIMEOUT_MS, 10) || 120000;
+
+// One worker per script, shared by every caller in this process
+const workers = new Map();
+
+class PythonWorker {
+  /**
+   * @param {string} scriptPath - Path to Python script
+   * @param {Array<string>} args - Arguments that put the script in server mode
+   */
+  constructor(scriptPath, args = ['--server']) {
+    this.scriptPath = scriptPath;
+    this.args = args;
+    this.label = path.basename(scriptPath);
+    this.process = null;
+    this.pending = new Map();
+    this.nextId = 1;
+  }
+
+  start() {
+    const child = spawn('python', [this.scriptPath, ...this.args]);
+
+    readline.createInterface({ input: child.stdout }).on('line', (line) => {
+      // Ignore leftover output from a worker that was already killed
+      if (this.process === child) {
+        this.handleLine(line);
+      }
+    });
+
+    child.stderr.on('data', (data) => {
+      console.error(`[PythonWorker:${this.label}] ${data.toString().trim()}`);
+    });
+
+    child.stdin.on('error', (err) => {
+      this.handleExit(child, err);
+    });
+
+    child.on('error', (err) => {
+      console.error(`[PythonWorker:${this.label}] Failed to start Python subprocess:`, err);
+      this.handleExit(child, err);
+    });
+
+    child.on('close', (code) => {
+      this.handleExit(child, new Error(`Python worker exited with code ${code}`));
+    });
+
+    this.process = child;
+    return child;
+  }
+
+  handleLine(line) {
+    if (!line.trim()) {
+      return;
+    }
+
+    let message;
+    try {
+      message = JSON.parse(line);
+    } catch (e) {
+      // The protocol is out of sync: restart the worker on the next request
+      console.error(`[PythonWorker:${this.label}] Failed to parse output:`, line);
+      this.kill(new Error(`Unparseable output from Python worker: ${line.slice(0, 200)}`));
+      return;
+    }
+
+    if (message.id === null || message.id === undefined) {
+      // The worker couldn't read a request's id, so no single caller can be told
+      console.error(`[PythonWorker:${this.label}] Error without request id:`, message.error);
+      this.failPending(new Error(message.error || 'Python worker error without request id'));
+      return;
+    }
+
+    const request = this.pending.get(message.id);
+    if (!request) {
+      return;
+    }
+
+    this.pending.delete(message.id);
+    clearTimeout(request.timer);
+    this.updateRef();
+
+    if (message.error) {
+      request.reject(new Error(message.error));
+    } else {
+      request.resolve(message.result);
+    }
+  }
+
+  handleExit(child, error) {
+    if (this.process !== child) {
+      return;
+    }
+
+    this.process = null;
+    this.failPending(error);
+  }
+
+  /**
+   * Reject every request still waiting for a response
+   * @param {Error} error - Rejection reason
+   */
+  failPending(error) {
+    for (const request of this.pending.values()) {
+      clearTimeout(request.timer);
+      request.reject(error);
+    }
+    this.pending.clear();
+    this.updateRef();
+  }
+
+  /**
+   * Fail pending requests and stop the process; the next request respawns it
+   * @param {Error} error - Rejection reason
+   */
+  kill(error) {
+    const child = this.process;
+    if (!child) {
+      return;
+    }
+    this.handleExit(child, error);
+    child.kill();
+  }
+
+  /**
+   * Only hold the event loop open while requests are in flight,
+   * so CLI scripts can still exit once their work is done
+   */
+  updateRef() {
+    const child = this.process;
+    if (!child) {
+      return;
+    }
+
+    const method = this.pending.size > 0 ? 'ref' : 'unref';
+    child[method]();
+    for (const stream of [child.stdin, child.stdout, child.stderr]) {
+      if (stream && typeof stream[method] === 'function') {
+        stream[method]();
+      }
+    }
+  }
+
+  /**
+   * Send one request to the worker
+   * @param {Object} payload - Request body (merged with the request id)
+   * @returns {Promise<any>} The worker's result
+   */
+  request(payload) {
+    const child = this.process || this.start();
+    const id = this.nextId++;
+
+    return new Promise((resolve, reject) => {
+      const timer = setTimeout(() => {
+        if (this.pending.delete(id)) {
+          this.updateRef();
+          reject(new Error(`Python worker request timed out after ${REQUEST_TIMEOUT_MS} ms`));
+        }
+      }, REQUEST_TIMEOUT_MS);
+      timer.unref();
+      this.pending.set(id, { resolve, reject, timer });
+      this.updateRef();
+      child.stdin.write(JSON.stringify({ id, ...payload }) + '\n');
+    });
+  }
+
+  stop() {
+    if (this.process) {
+      this.process.stdin.end();
+    }
+  }
+}
+
+/**
+ * Get the shared worker for a script in backend/ai_scripts
+ * @param {string} scriptName - Script file name (e.g. 'embed_text.py')
+ * @returns {PythonWorker}
+ */
+function getWorker(scriptName) {
+  if (!workers.has(scriptName)) {
+    workers.set(scriptName, new PythonWorker(path.join(AI_SCRIPTS_DIR, scriptName)));
+  }
+  return workers.get(scriptName);
+}
+
+/**
+ * Run a task on the shared ai_worker.py process
+ * @param {string} task - 'embed' | 'hybrid' | 'sentiment' | 'price' | 'predict' | 'evaluate'
+ * @param {Object} args - Task arguments
+ * @returns {Promise<any>} Task result
+ */
+function runAITask(task, args) {
+  return getWorker('ai_worker.py').request({ task, args });
+}
+
+/**
+ * Expand an int8-quantized embedding from the worker back to floats
+ * @param {Object} embedding - {q: Array<number>, scale: number}
+ * @returns {Array<number>|null} Embedding vector, or null if malformed
+ */
+function dequantizeEmbedding(embedding) {
+  if (!embedding || !Array.isArray(embedding.q) || typeof embedding.scale !== 'number') {
+    return null;
+  }
+  return embedding.q.map((value) => value * embedding.scale);
+}
+
+module.exports = {
+  PythonWorker,
+  getWorker,
+  runAITask,
+  dequantizeEmbedding
+};
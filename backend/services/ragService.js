@@ -11,12 +11,17 @@
   CHANGES (2025-12-07):
   - Refactored to use Pinecone instead of MongoDB Atlas Vector Search
   - Falls back to brute-force if Pinecone unavailable
+
+  CHANGES (2025-12-08):
+  - Embeddings come from the persistent Python AI worker instead of
+    spawning Python (and reloading the model) for every text
+  - Worker sends embeddings int8-quantized; they are expanded back to floats here
 */
 
-const { spawn } = require('child_process');
 const path = require('path');
 const Article = require('../models/Article');
 const pineconeService = require('./pineconeService');
+const { runAITask, dequantizeEmbedding } = require('./pythonWorkerService');
 
 // RAG storage directory
 const RAG_STORAGE_DIR = path.join(__dirname, '..', 'rag_storage');
@@ -240,50 +245,17 @@ async function searchWithBruteForce(queryEmbedding, symbol, limit, threshold) {
 }
 
 /**
- * Generate embedding for text using Python script
+ * Generate embedding for text using the persistent Python AI worker
  * @param {string} text - Text to embed
  * @returns {Promise<Array<number>|null>} Embedding vector or null
  */
-function generateEmbedding(text) {
-  return new Promise((resolve, reject) => {
-    const pythonScriptPath = path.join(__dirname, '..', 'ai_scripts', 'embed_text.py');
-    const pythonProcess = spawn('python', [pythonScriptPath, text]);
-    
-    let embeddingResult = '';
-    let errorOutput = '';
-    
-    pythonProcess.stdout.on('data', (data) => {
-      embeddingResult += data.toString().trim();
-    });
-    
-    pythonProcess.stderr.on('data', (data) => {
-      errorOutput += data.toString();
-    });
-    
-    pythonProcess.on('close', (code) => {
-      if (code !== 0) {
-        console.error(`[RAGService] Embedding script exited with code ${code}. Error: ${errorOutput}`);
-        return resolve(null);
-      }
-      
-      try {
-        const embedding = JSON.parse(embeddingResult);
-        if (Array.isArray(embedding)) {
-          resolve(embedding);
-        } else {
-          resolve(null);
-        }
-      } catch (e) {
-        console.error('[RAGService] Failed to parse embedding:', embeddingResult);
-        resolve(null);
-      }
-    });
-    
-    pythonProcess.on('error', (err) => {
-      console.error('[RAGService] Failed to start embedding Python subprocess:', err);
-      resolve(null);
-    });
-  });
+async function generateEmbedding(text) {
+  try {
+    return dequantizeEmbedding(await runAITask('embed', { text }));
+  } catch (error) {
+    console.error('[RAGService] Embedding generation failed:', error.message);
+    return null;
+  }
 }
 
 /**